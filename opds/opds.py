@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from types import MappingProxyType
 from typing import Any, Callable, Dict, List
 from urllib.parse import quote, unquote, urlencode
 
@@ -15,11 +16,27 @@ from search.constants import (
     SearchType,
     SortDirection,
 )
-from search.full_text_search import FullTextSearch
+from search.full_text_search import FullTextSearch, SearchQuery
 
 SAMPLE_LIMIT = 15
 LANGUAGE_LIST = [{"code": l.code, "label": l.label} for l in Language]
-_VALID_SORTS = set(OrderBy._value2member_map_.keys())
+_CURATED_BY_GENRE = MappingProxyType({cat.genre: cat for cat in CuratedBookshelves})
+# Curated shelf id -> (shelf name, genre)
+_CURATED_SHELF_BY_ID = MappingProxyType(
+    {
+        sid: (sname, cat.genre)
+        for cat in CuratedBookshelves
+        for sid, sname in cat.shelves
+    }
+)
+_VALID_SORTS = frozenset(OrderBy._value2member_map_)
+_SEARCH_FIELDS = frozenset(SearchField._value2member_map_)
+# Facet param value -> SearchQuery filter method
+_COPYRIGHT_FILTERS = {
+    "true": SearchQuery.copyrighted,
+    "false": SearchQuery.public_domain,
+}
+_AUDIOBOOK_FILTERS = {"true": SearchQuery.audiobook, "false": SearchQuery.text_only}
 
 
 def _parse_field(field: str) -> tuple[SearchField, SearchType]:
@@ -32,11 +49,26 @@ def _parse_field(field: str) -> tuple[SearchField, SearchType]:
         search_type, field_name = SearchType.FUZZY, field
 
     field_name = "book" if field_name == "keyword" else field_name
-    if field_name not in {f.value for f in SearchField}:
+    if field_name not in _SEARCH_FIELDS:
         return SearchField.BOOK, SearchType.FUZZY
     return SearchField(field_name), search_type
 
 
+def _apply_facet_filters(
+    q: SearchQuery, lang: str, copyrighted: str, audiobook: str, locc: str = ""
+) -> SearchQuery:
+    """Apply language/copyright/format/LoCC facet params to a query."""
+    if lang:
+        q.lang(lang)
+    if copyrighted in _COPYRIGHT_FILTERS:
+        _COPYRIGHT_FILTERS[copyrighted](q)
+    if audiobook in _AUDIOBOOK_FILTERS:
+        _AUDIOBOOK_FILTERS[audiobook](q)
+    if locc:
+        q.locc(locc)
+    return q
+
+
 def _facet_link(href: str, title: str, is_active: bool) -> dict:
     """Build a facet link. Only includes 'rel' if active (per OPDS 2.0 spec)."""
     link = {"href": href, "type": "application/opds+json", "title": title}
@@ -73,17 +105,7 @@ class API:
         if query.strip():
             sf, st = _parse_field("keyword")
             q.search(query, field=sf, search_type=st)
-        if lang:
-            q.lang(lang)
-        if copyrighted == "true":
-            q.copyrighted()
-        elif copyrighted == "false":
-            q.public_domain()
-        if audiobook == "true":
-            q.audiobook()
-        elif audiobook == "false":
-            q.text_only()
-        return q
+        return _apply_facet_filters(q, lang, copyrighted, audiobook)
 
     def _apply_sort(self, q, sort: str, sort_order: str, has_query: bool):
         """Apply sorting to a query object."""
@@ -428,14 +450,9 @@ class API:
         sort_order: str,
     ):
         """Browse books in a specific bookshelf."""
-        bookshelf_name, parent_category = f"Bookshelf {bookshelf_id}", None
-        for cat in CuratedBookshelves:
-            for sid, sname in cat.shelves:
-                if sid == bookshelf_id:
-                    bookshelf_name, parent_category = sname, cat.genre
-                    break
-            if parent_category:
-                break
+        bookshelf_name, parent_category = _CURATED_SHELF_BY_ID.get(
+            bookshelf_id, (f"Bookshelf {bookshelf_id}", None)
+        )
 
         try:
             q = self.fts.query(crosswalk=Crosswalk.OPDS)
@@ -532,39 +549,38 @@ class API:
 
     def _bookshelf_category(self, category: str):
         """List shelves in a category with sample groups. Navigation appears first, then groups."""
-        found = next((cat for cat in CuratedBookshelves if cat.genre == category), None)
+        found = _CURATED_BY_GENRE.get(category)
         if not found:
             raise cherrypy.HTTPError(404, "Category not found")
 
         shelves = [{"id": s[0], "name": s[1]} for s in found.shelves]
         groups = []
         book_counts = {}
+        try:
+            samples = self.fts.get_bookshelf_samples_batch(
+                [s["id"] for s in shelves], SAMPLE_LIMIT
+            )
+        except Exception as e:
+            cherrypy.log(f"Error fetching bookshelf samples for {category}: {e}")
+            samples = {}
         for s in shelves:
-            try:
-                q = self.fts.query(crosswalk=Crosswalk.OPDS)
-                q.bookshelf_id(s["id"]).order_by(OrderBy.RANDOM)[1, SAMPLE_LIMIT]
-                result = self.fts.execute(q)
-                total = result.get("total", 0)
-                book_counts[s["id"]] = total
-                if result.get("results"):
-                    groups.append(
-                        {
-                            "metadata": {"title": s["name"], "numberOfItems": total},
-                            "links": [
-                                {
-                                    "href": f"/opds/bookshelves?id={s['id']}",
-                                    "rel": "self",
-                                    "type": "application/opds+json",
-                                }
-                            ],
-                            "publications": result["results"],
-                        }
-                    )
-            except Exception as e:
-                cherrypy.log(
-                    f"Error fetching bookshelf samples for shelf {s['id']}: {e}"
+            sample = samples.get(s["id"], {"total": 0, "results": []})
+            total = sample["total"]
+            book_counts[s["id"]] = total
+            if sample["results"]:
+                groups.append(
+                    {
+                        "metadata": {"title": s["name"], "numberOfItems": total},
+                        "links": [
+                            {
+                                "href": f"/opds/bookshelves?id={s['id']}",
+                                "rel": "self",
+                                "type": "application/opds+json",
+                            }
+                        ],
+                        "publications": sample["results"],
+                    }
                 )
-                book_counts[s["id"]] = 0
 
         return {
             "metadata": {"title": category, "numberOfItems": len(shelves)},
@@ -621,8 +637,6 @@ class API:
 
         # If children exist, return navigation
         if children:
-            children.sort(key=lambda x: (len(x.get("code", "")), x.get("code", "")))
-
             # Get counts: subcategory counts for items with children, book counts for leaf nodes
             codes_with_children = [c["code"] for c in children if c.get("has_children")]
             codes_without_children = [
@@ -986,28 +1000,15 @@ class API:
                 q.search(query, field=search_field, search_type=search_type)
 
             self._apply_sort(q, sort, sort_order, bool(query.strip()))
-
-            if lang:
-                q.lang(lang)
-            if copyrighted == "true":
-                q.copyrighted()
-            elif copyrighted == "false":
-                q.public_domain()
-            if audiobook == "true":
-                q.audiobook()
-            elif audiobook == "false":
-                q.text_only()
-            if locc:
-                q.locc(locc)
+            _apply_facet_filters(q, lang, copyrighted, audiobook, locc)
 
             q[page, limit]
-            result = self.fts.execute(q)
-
             top_subjects = None
             if query.strip() or locc or lang:
-                top_subjects = self._get_top_subjects_for_search(
-                    query, search_field, search_type, lang, copyrighted, audiobook, locc
-                )
+                result = self.fts.execute_with_facets(q, facet_limit=15, max_books=500)
+                top_subjects = result.pop("facets")
+            else:
+                result = self.fts.execute(q)
         except Exception as e:
             cherrypy.log(f"Search error: {e}")
             raise cherrypy.HTTPError(500, "Search failed")
@@ -1068,31 +1069,6 @@ class API:
         self._append_pagination_links(feed["links"], url, result)
         return feed
 
-    def _get_top_subjects_for_search(
-        self, query, search_field, search_type, lang, copyrighted, audiobook, locc
-    ):
-        """Get top subjects for search results."""
-        try:
-            q_sub = self.fts.query()
-            if query.strip():
-                q_sub.search(query, field=search_field, search_type=search_type)
-            if lang:
-                q_sub.lang(lang)
-            if copyrighted == "true":
-                q_sub.copyrighted()
-            elif copyrighted == "false":
-                q_sub.public_domain()
-            if audiobook == "true":
-                q_sub.audiobook()
-            elif audiobook == "false":
-                q_sub.text_only()
-            if locc:
-                q_sub.locc(locc)
-            return self.fts.get_top_subjects_for_query(q_sub, limit=15, max_books=500)
-        except Exception as e:
-            cherrypy.log(f"Top subjects error: {e}")
-            return None
-
     def _build_search_facets(
         self,
         query,
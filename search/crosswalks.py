@@ -1,9 +1,44 @@
-import html
+import re
+from types import MappingProxyType
 from typing import Any
 
 from .constants import Crosswalk
 from .helpers import format_dict_result
 
+_RE_UPDATED = re.compile(r"Updated:\s*(\S+)")
+# Acquisition filetypes in order of preference.
+# Audiobooks: use HTML index | Text books: prefer EPUB3 with images
+_AUDIO_FORMATS = ("index", "html")
+_TEXT_FORMATS = (
+    "epub3.images",
+    "epub.images",
+    "epub.noimages",
+    "kindle.images",
+    "pdf.images",
+    "pdf.noimages",
+    "html",
+)
+_AUDIO_FORMAT_RANK = {ft: i for i, ft in enumerate(_AUDIO_FORMATS)}
+_TEXT_FORMAT_RANK = {ft: i for i, ft in enumerate(_TEXT_FORMATS)}
+# Same replacements as html.escape(quote=True), applied in one pass
+_HTML_ESCAPE = str.maketrans(
+    {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#x27;"}
+)
+
+_GUTEN_BASE = "https://www.gutenberg.org/"
+_EMPTY_DICT = MappingProxyType({})
+
+
+def _file_url(fn: str) -> str:
+    """Absolute URL for a format filename; most are already relative without a slash."""
+    if fn.startswith(("http://", "https://")):
+        return fn
+    return _GUTEN_BASE + (fn.lstrip("/") if fn[:1] == "/" else fn)
+
+
+def _first(xs, default=None):
+    return xs[0] if xs else default
+
 
 @format_dict_result
 def crosswalk_full(row) -> dict[str, Any]:
@@ -34,12 +69,12 @@ def crosswalk_pg(row) -> dict[str, Any]:
         "title": row.title,
         "contributors": [
             {"name": c.get("name"), "role": c.get("role", "Author")}
-            for c in dc.get("creators", [])
+            for c in dc.get("creators", ())
         ],
         "language": dc.get("language"),
-        "subjects": [s["subject"] for s in dc.get("subjects", []) if s.get("subject")],
+        "subjects": [s["subject"] for s in dc.get("subjects", ()) if s.get("subject")],
         "bookshelves": [
-            b["bookshelf"] for b in dc.get("bookshelves", []) if b.get("bookshelf")
+            b["bookshelf"] for b in dc.get("bookshelves", ()) if b.get("bookshelf")
         ],
         "release_date": dc.get("date"),
         "downloads_last_30_days": row.downloads,
@@ -49,10 +84,10 @@ def crosswalk_pg(row) -> dict[str, Any]:
                 "type": f.get("mediatype"),
                 "size": f.get("extent"),
             }
-            for f in dc.get("format", [])
+            for f in dc.get("format", ())
             if f.get("filename")
         ],
-        "cover_url": (dc.get("coverpage") or [None])[0],
+        "cover_url": _first(dc.get("coverpage")),
     }
 
 
@@ -65,10 +100,10 @@ def crosswalk_opds(row) -> dict[str, Any]:
         "@type": "http://schema.org/Book",
         "identifier": f"urn:gutenberg:{row.book_id}",
         "title": row.title,
-        "language": (dc.get("language") or [{}])[0].get("code") or "en",
+        "language": (_first(dc.get("language")) or _EMPTY_DICT).get("code") or "en",
     }
 
-    creators = dc.get("creators", [])
+    creators = dc.get("creators", ())
     if creators and creators[0].get("name"):
         p = creators[0]
         author = {"name": p["name"], "sortAs": p["name"]}
@@ -79,28 +114,35 @@ def crosswalk_opds(row) -> dict[str, Any]:
     if dc.get("date"):
         metadata["published"] = dc["date"]
 
-    for m in dc.get("marc", []):
-        if m.get("code") == 508 and "Updated:" in (m.get("text") or ""):
-            try:
-                modified = m["text"].split("Updated:")[1].strip().split()[0].rstrip(".")
-                if modified:
-                    metadata["modified"] = modified
-            except (IndexError, AttributeError):
-                pass
-            break
+    # Single pass over MARC: 508 credits carry the update date, 908 the reading level
+    updated_note = reading_level = None
+    for m in dc.get("marc", ()):
+        code = m.get("code")
+        if code == 508:
+            if updated_note is None and "Updated:" in (m.get("text") or ""):
+                updated_note = m["text"]
+                if reading_level:
+                    break
+        elif code == 908:
+            if reading_level is None and m.get("text"):
+                reading_level = m["text"]
+                if updated_note:
+                    break
+
+    if updated_note and (match := _RE_UPDATED.search(updated_note)):
+        if modified := match.group(1).rstrip("."):
+            metadata["modified"] = modified
 
     desc_parts = []
-    if summary := (dc.get("summary") or [None])[0]:
+    if summary := _first(dc.get("summary")):
         desc_parts.append(summary)
     if notes := dc.get("description"):
         desc_parts.append(f"Notes: {'; '.join(notes)}")
-    if credits := (dc.get("credits") or [None])[0]:
+    if credits := _first(dc.get("credits")):
         desc_parts.append(f"Credits: {credits}")
-    for m in dc.get("marc", []):
-        if m.get("code") == 908 and m.get("text"):
-            desc_parts.append(f"Reading Level: {m['text']}")
-            break
-    if dcmitype := [t["dcmitype"] for t in dc.get("type", []) if t.get("dcmitype")]:
+    if reading_level:
+        desc_parts.append(f"Reading Level: {reading_level}")
+    if dcmitype := [t["dcmitype"] for t in dc.get("type", ()) if t.get("dcmitype")]:
         desc_parts.append(f"Category: {', '.join(dcmitype)}")
     if rights := dc.get("rights"):
         desc_parts.append(f"Rights: {rights}")
@@ -108,19 +150,21 @@ def crosswalk_opds(row) -> dict[str, Any]:
 
     if desc_parts:
         metadata["description"] = (
-            "<p>" + "</p><p>".join(html.escape(p) for p in desc_parts) + "</p>"
+            "<p>"
+            + "</p><p>".join([p.translate(_HTML_ESCAPE) for p in desc_parts])
+            + "</p>"
         )
 
-    subjects = [s["subject"] for s in dc.get("subjects", []) if s.get("subject")]
-    subjects += [c["locc"] for c in dc.get("coverage", []) if c.get("locc")]
+    subjects = [s["subject"] for s in dc.get("subjects", ()) if s.get("subject")]
+    subjects += [c["locc"] for c in dc.get("coverage", ()) if c.get("locc")]
     if subjects:
         metadata["subject"] = subjects
 
-    if pub_raw := (dc.get("publisher") or {}).get("raw"):
+    if pub_raw := (dc.get("publisher") or _EMPTY_DICT).get("raw"):
         metadata["publisher"] = pub_raw
 
     collections = []
-    for b in dc.get("bookshelves", []):
+    for b in dc.get("bookshelves", ()):
         if b.get("bookshelf"):
             collections.append(
                 {
@@ -128,7 +172,7 @@ def crosswalk_opds(row) -> dict[str, Any]:
                     "identifier": f"https://www.gutenberg.org/ebooks/bookshelf/{b.get('id', '')}",
                 }
             )
-    for c in dc.get("coverage", []):
+    for c in dc.get("coverage", ()):
         if c.get("locc"):
             collections.append(
                 {
@@ -141,41 +185,49 @@ def crosswalk_opds(row) -> dict[str, Any]:
 
     links = []
 
-    # Audiobooks: use HTML index | Text books: prefer EPUB3 with images
-    target_format = "index" if row.is_audio else "epub3.images"
-    fallback_formats = ["epub.images", "epub.noimages", "kindle.images", "pdf.images", "pdf.noimages", "html"] if not row.is_audio else ["html"]
-
-    # Try target format first, then fallbacks
-    for try_format in [target_format] + fallback_formats:
-        for f in dc.get("format", []):
-            fn = f.get("filename")
-            if not fn:
-                continue
-            ftype = (f.get("filetype") or "").strip().lower()
-            if ftype != try_format:
-                continue
-
-            href = (
-                fn
-                if fn.startswith(("http://", "https://"))
-                else f"https://www.gutenberg.org/{fn.lstrip('/')}"
-            )
-            mtype = (f.get("mediatype") or "").strip()
-
-            link = {
-                "rel": "http://opds-spec.org/acquisition/open-access",
-                "href": href,
-                "type": mtype or "application/epub+zip",
-            }
-            if f.get("extent") is not None and f["extent"] > 0:
-                link["length"] = f["extent"]
-            if f.get("hr_filetype"):
-                link["title"] = f["hr_filetype"]
-            links.append(link)
-            break
-        if links:
+    # One pass over formats: pick the most preferred acquisition filetype (first
+    # listed entry wins ties) and collect the first cover plus the medium cover.
+    ranks = _AUDIO_FORMAT_RANK if row.is_audio else _TEXT_FORMAT_RANK
+    best, best_rank = None, len(ranks)
+    images = []
+    has_medium = False
+    for f in dc.get("format", ()):
+        fn = f.get("filename")
+        if not fn:
+            continue
+        ft = f.get("filetype") or ""
+        if best_rank:
+            # Filetypes are almost always stored canonical; normalize only on a miss
+            rank = ranks.get(ft)
+            if rank is None:
+                rank = ranks.get(ft.strip().lower(), best_rank)
+            if rank < best_rank:
+                best, best_rank = f, rank
+        if not has_medium and "cover" in ft:
+            if "cover.medium" in ft:
+                images.append({"href": _file_url(fn), "type": "image/jpeg"})
+                has_medium = True
+            elif not images:
+                images.append({"href": _file_url(fn), "type": "image/jpeg"})
+        if not best_rank and has_medium:
             break
 
+    if best is not None:
+        fn = best["filename"]
+        href = _file_url(fn)
+        mtype = (best.get("mediatype") or "").strip()
+
+        link = {
+            "rel": "http://opds-spec.org/acquisition/open-access",
+            "href": href,
+            "type": mtype or "application/epub+zip",
+        }
+        if best.get("extent") is not None and best["extent"] > 0:
+            link["length"] = best["extent"]
+        if best.get("hr_filetype"):
+            link["title"] = best["hr_filetype"]
+        links.append(link)
+
     # OPDS 2.0 requires at least one acquisition link - fallback to readable HTML page
     if not links:
         links.append({
@@ -185,21 +237,6 @@ def crosswalk_opds(row) -> dict[str, Any]:
         })
 
     result = {"metadata": metadata, "links": links}
-
-    images = []
-    for f in dc.get("format", []):
-        ft = f.get("filetype") or ""
-        fn = f.get("filename")
-        if fn and ("cover.medium" in ft or ("cover" in ft and not images)):
-            href = (
-                fn
-                if fn.startswith(("http://", "https://"))
-                else f"https://www.gutenberg.org/{fn.lstrip('/')}"
-            )
-            img = {"href": href, "type": "image/jpeg"}
-            images.append(img)
-            if "cover.medium" in ft:
-                break
     if images:
         result["images"] = images
 
@@ -1,10 +1,17 @@
 from __future__ import annotations
 
+import json
+import logging
+import os
+from collections import namedtuple
 from dataclasses import dataclass, field
+from functools import lru_cache
 from typing import Callable, Tuple, Union
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql.elements import TextClause
 
 from .constants import (
     Crosswalk,
@@ -18,7 +25,7 @@ from .constants import (
     SortDirection,
 )
 from .crosswalks import CROSSWALK_MAP
-from .helpers import get_locc_children
+from .helpers import TTLCache, freeze_params, get_locc_children
 
 __all__ = [
     "Config",
@@ -26,6 +33,8 @@ __all__ = [
     "SearchQuery",
 ]
 
+log = logging.getLogger(__name__)
+
 _FIELD_COLS = {
     SearchField.BOOK: ("tsvec", "book_text"),
     SearchField.TITLE: ("title_tsvec", "title"),
@@ -35,6 +44,29 @@ _FIELD_COLS = {
     SearchField.BOOKSHELF: ("bookshelf_tsvec", "bookshelf_text"),
     SearchField.ATTRIBUTE: ("attribute_tsvec", "attribute_text"),
 }
+
+# jsonb containment payloads for the enum-valued format filters
+_FILE_TYPE_JSON = {ft: json.dumps([{"mediatype": ft.value}]) for ft in FileType}
+_ENCODING_JSON = {enc: json.dumps([{"encoding": enc.value}]) for enc in Encoding}
+
+
+def _search_templates(fts_col: str, text_col: str) -> dict:
+    return {
+        SearchType.FTS: (
+            f"{fts_col} @@ websearch_to_tsquery('english', :{{}})",
+            fts_col,
+        ),
+        SearchType.FUZZY: (f":{{}} <% {text_col}", text_col),
+        SearchType.CONTAINS: (f"{text_col} ILIKE :{{}}", text_col),
+    }
+
+
+# (field, search type) -> (clause with a {} slot for the bind name, rank column)
+_SEARCH_SQL = {
+    (field, search_type): template
+    for field, cols in _FIELD_COLS.items()
+    for search_type, template in _search_templates(*cols).items()
+}
 _ORDER_COLUMNS = {
     OrderBy.DOWNLOADS: ("downloads", SortDirection.DESC, None),
     OrderBy.TITLE: ("title", SortDirection.ASC, None),
@@ -42,14 +74,127 @@ _ORDER_COLUMNS = {
     OrderBy.RELEASE_DATE: ("release_date", SortDirection.DESC, "LAST"),
     OrderBy.RANDOM: ("RANDOM()", None, None),
 }
+
+
+def _order_clause(col: str, direction: SortDirection, nulls: str | None) -> str:
+    clause = f"{col} {direction.value.upper()}"
+    return f"{clause} NULLS {nulls}" if nulls else clause
+
+
+# Every non-relevance ORDER BY, keyed by (order, explicit direction or None)
+_ORDER_SQL = {
+    (order, sort_dir): _order_clause(col, sort_dir or default_dir, nulls)
+    for order, (col, default_dir, nulls) in _ORDER_COLUMNS.items()
+    if order != OrderBy.RANDOM
+    for sort_dir in (None, *SortDirection)
+}
+_ORDER_SQL.update({(OrderBy.RANDOM, d): "RANDOM()" for d in (None, *SortDirection)})
+# Facets sample the most downloaded matches, whatever order the page is shown in
+_FACET_ORDER = _ORDER_SQL[(OrderBy.DOWNLOADS, None)]
+# ORDER BY clauses that idx_mv_btree_downloads / idx_mv_btree_release_date return
+# in order. A plain page stops after LIMIT rows there, but COUNT(*) OVER() has to
+# read every match first, so these sorts keep the separate COUNT.
+_INDEX_ORDERS = frozenset(
+    _ORDER_SQL[order, None] for order in (OrderBy.DOWNLOADS, OrderBy.RELEASE_DATE)
+)
 _SELECT = "book_id, title, all_authors, downloads, dc, is_audio"
-_SUBQUERY = """book_id, title, all_authors, all_subjects, downloads, release_date, dc,
-    copyrighted, lang_codes, is_audio,
-    max_author_birthyear, min_author_birthyear,
-    max_author_deathyear, min_author_deathyear,
-    locc_codes,
-    tsvec, title_tsvec, subtitle_tsvec, author_tsvec, subject_tsvec, bookshelf_tsvec, attribute_tsvec,
-    book_text, bookshelf_text, attribute_text, subtitle"""
+# Narrower column lists for crosswalks that never read dc (the bulk of each row)
+_CROSSWALK_SELECT = {Crosswalk.MINI: "book_id, title, all_authors, downloads"}
+
+
+_MISSING = object()
+
+# Bookshelf sample rows; attribute access like a Row, so crosswalks work unchanged
+_SampleRow = namedtuple(
+    "_SampleRow", "bs_id total book_id title all_authors downloads dc is_audio"
+)
+
+# LATERAL samples each shelf on its own instead of ranking every shelf's books
+# together; the (fk_bookshelves, fk_books) index feeds each EXISTS probe, which
+# also keeps a duplicated link from counting or sampling its book twice. The
+# shelf total rides along on every sample row, so totals need no second query.
+_SHELF_SAMPLES_SQL = """
+    SELECT bs.id AS bs_id, t.total, mv.book_id, mv.title, mv.all_authors,
+           mv.downloads, mv.dc, mv.is_audio
+    FROM unnest(%(ids)s::int[]) AS bs(id)
+    CROSS JOIN LATERAL (
+        SELECT COUNT(*) AS total
+        FROM mv_books_dc mv
+        WHERE EXISTS (
+            SELECT 1 FROM mn_books_bookshelves mbb
+            WHERE mbb.fk_books = mv.book_id AND mbb.fk_bookshelves = bs.id
+        )
+    ) t
+    CROSS JOIN LATERAL (
+        SELECT mv.book_id, mv.title, mv.all_authors, mv.downloads, mv.dc, mv.is_audio
+        FROM mv_books_dc mv
+        WHERE EXISTS (
+            SELECT 1 FROM mn_books_bookshelves mbb
+            WHERE mbb.fk_books = mv.book_id AND mbb.fk_bookshelves = bs.id
+        )
+        ORDER BY random()
+        LIMIT %(sample_limit)s
+    ) mv
+"""
+
+
+@lru_cache(maxsize=512)
+def _stmt(sql: str) -> TextClause:
+    """text() re-parses bind params on every call; reuse clauses for repeated SQL."""
+    return text(sql)
+
+
+# Bind names are assigned in call order, so equal query shapes give equal fragments
+# and the composed SQL, LIMIT/OFFSET binds included, can be shared across requests.
+@lru_cache(maxsize=1024)
+def _select_sql(
+    search: tuple[str, ...],
+    filters: tuple[str, ...],
+    order: str,
+    select: str = _SELECT,
+    total: bool = False,
+) -> str:
+    # The window is evaluated after WHERE but before LIMIT, i.e. over the full match set
+    cols = f"{select}, COUNT(*) OVER() AS _total" if total else select
+    return f"SELECT {cols} {_from_sql(search, filters)} ORDER BY {order} LIMIT :_limit OFFSET :_offset"
+
+
+@lru_cache(maxsize=1024)
+def _from_sql(search: tuple[str, ...], filters: tuple[str, ...]) -> str:
+    # One flat WHERE: the planner would pull up a search subquery anyway, and this
+    # way it weighs the tsvector and filter indexes together. Each fragment is
+    # parenthesized so an OR in a where() clause cannot escape its conjunct.
+    where = " AND ".join(f"({c})" for c in search + filters)
+    return f"FROM mv_books_dc WHERE {where}" if where else "FROM mv_books_dc"
+
+
+@lru_cache(maxsize=1024)
+def _count_sql(search: tuple[str, ...], filters: tuple[str, ...]) -> str:
+    return f"SELECT COUNT(*) {_from_sql(search, filters)}"
+
+
+@lru_cache(maxsize=1024)
+def _top_subjects_sql(
+    search: tuple[str, ...], filters: tuple[str, ...], order: str
+) -> str:
+    return f"""
+        WITH matched_books AS (
+            SELECT book_id
+            {_from_sql(search, filters)}
+            ORDER BY {order}
+            LIMIT :max_books
+        )
+        SELECT
+            s.pk AS id,
+            s.subject AS name,
+            COUNT(*) AS count
+        FROM matched_books mb
+        JOIN mn_books_subjects mbs ON mbs.fk_books = mb.book_id
+        JOIN subjects s ON s.pk = mbs.fk_subjects
+        GROUP BY s.pk, s.subject
+        ORDER BY count DESC
+        LIMIT :limit
+    """
 
 
 class Config:
@@ -57,6 +202,13 @@ class Config:
     PGPORT = "5432"
     PGDATABASE = "gutendb"
     PGUSER = "postgres"
+    # jit=off when False, jit=on when True. JIT compile time can outweigh its gain on
+    # these short, high-cost-estimate queries. None (default) sends no options
+    # parameter: PgBouncer rejects it, and servers before PostgreSQL 11 reject jit.
+    JIT = None
+    # Seconds to reuse totals, pages and lookups; 0 disables caching. Off by default
+    # because refresh_mv_books_dc() runs out of process and cannot clear it.
+    CACHE_TTL = 0
 
 
 # =============================================================================
@@ -64,16 +216,18 @@ class Config:
 # =============================================================================
 
 
-@dataclass
+@dataclass(slots=True)
 class SearchQuery:
     _search: list[tuple[str, dict, str]] = field(default_factory=list)
     _filter: list[tuple[str, dict]] = field(default_factory=list)
+    _bind: dict[str, object] = field(default_factory=dict)
     _order: OrderBy = OrderBy.DOWNLOADS
     _sort_dir: SortDirection | None = None
     _page: int = 1
     _page_size: int = 25
     _crosswalk: Crosswalk = Crosswalk.PG
     _param_counter: int = 0
+    _shape_memo: tuple | None = field(default=None, repr=False, compare=False)
 
     def __getitem__(self, key: int | tuple) -> SearchQuery:
         """Set pagination: q[3] for page 3, q[2, 50] for page 2 with 50 results."""
@@ -120,6 +274,7 @@ class SearchQuery:
             placeholders.append(f":{pname}")
         sql = sql_template.format(*placeholders)
         self._filter.append((sql, params))
+        self._bind.update(params)
         return self
 
     def search(
@@ -132,18 +287,14 @@ class SearchQuery:
         if not txt:
             return self
 
-        fts_col, text_col = _FIELD_COLS[field]
-
-        if search_type == SearchType.FTS:
-            pname, p = self._new_param(txt)
-            sql = f"{fts_col} @@ websearch_to_tsquery('english', :{pname})"
-            self._search.append((sql, p, fts_col))
-        elif search_type == SearchType.FUZZY:
-            pname, p = self._new_param(txt)
-            self._search.append((f":{pname} <% {text_col}", p, text_col))
-        else:
-            pname, p = self._new_param(txt, wrap_percent=True)
-            self._search.append((f"{text_col} ILIKE :{pname}", p, text_col))
+        if search_type not in (SearchType.FTS, SearchType.FUZZY):
+            search_type = SearchType.CONTAINS
+        template, col = _SEARCH_SQL[field, search_type]
+        pname, p = self._new_param(
+            txt, wrap_percent=search_type == SearchType.CONTAINS
+        )
+        self._search.append((template.format(pname), p, col))
+        self._bind.update(p)
         return self
 
     # Filter Methods
@@ -214,17 +365,12 @@ class SearchQuery:
 
     def contributor_role(self, role: str) -> SearchQuery:
         return self.add_filter(
-            "dc->'creators' @> CAST({} AS jsonb)", f'[{{"role":"{role}"}}]'
+            "dc->'creators' @> CAST({} AS jsonb)", json.dumps([{"role": role}])
         )
 
     def file_type(self, ft: FileType | str) -> SearchQuery:
-        if isinstance(ft, FileType):
-            ft_value = ft.value
-        else:
-            ft_value = str(ft)
-        return self.add_filter(
-            "dc->'format' @> CAST({} AS jsonb)", f'[{{"mediatype":"{ft_value}"}}]'
-        )
+        payload = _FILE_TYPE_JSON.get(ft) or json.dumps([{"mediatype": str(ft)}])
+        return self.add_filter("dc->'format' @> CAST({} AS jsonb)", payload)
 
     def author_id(self, aid: int) -> SearchQuery:
         return self.add_filter(
@@ -244,13 +390,8 @@ class SearchQuery:
         )
 
     def encoding(self, enc: Encoding | str) -> SearchQuery:
-        if isinstance(enc, Encoding):
-            enc_val = enc.value
-        else:
-            enc_val = str(enc)
-        return self.add_filter(
-            "dc->'format' @> CAST({} AS jsonb)", f'[{{"encoding":"{enc_val}"}}]'
-        )
+        payload = _ENCODING_JSON.get(enc) or json.dumps([{"encoding": str(enc)}])
+        return self.add_filter("dc->'format' @> CAST({} AS jsonb)", payload)
 
     def where(self, sql: str, **params) -> SearchQuery:
         """Add raw SQL filter condition. BE CAREFUL WHEN USING!"""
@@ -260,17 +401,14 @@ class SearchQuery:
                     "Parameter name reserved by search engine: starts with '__p'"
                 )
         self._filter.append((sql, params))
+        self._bind.update(params)
         return self
 
     # === SQL Building ===
 
     def _params(self) -> dict[str, object]:
-        params = {}
-        for _, p, *_ in self._search:
-            params.update(p)
-        for _, p in self._filter:
-            params.update(p)
-        return params
+        # Copy: _order_sql() adds rank_q to the dict it is given
+        return dict(self._bind)
 
     def _order_sql(self, params: dict) -> str:
         if self._order == OrderBy.RELEVANCE and self._search:
@@ -281,53 +419,34 @@ class SearchQuery:
                 return f"word_similarity(:rank_q, {col}) DESC, downloads DESC"
             return f"ts_rank_cd({col}, websearch_to_tsquery('english', :rank_q)) DESC, downloads DESC"
 
-        if self._order == OrderBy.RANDOM:
-            return "RANDOM()"
+        return _ORDER_SQL.get((self._order, self._sort_dir), "downloads DESC")
 
-        if self._order not in _ORDER_COLUMNS:
-            return "downloads DESC"
+    def _shape(self) -> tuple[tuple[str, ...], tuple[str, ...]]:
+        # Clause lists are append-only, so their lengths identify the current shape
+        key = (len(self._search), len(self._filter))
+        if self._shape_memo is None or self._shape_memo[0] != key:
+            self._shape_memo = (
+                key,
+                tuple(s[0] for s in self._search),
+                tuple(f[0] for f in self._filter),
+            )
+        return self._shape_memo[1], self._shape_memo[2]
 
-        col, default_dir, nulls = _ORDER_COLUMNS[self._order]
-        direction = self._sort_dir or default_dir
-        clause = f"{col} {direction.value.upper()}"
-        if nulls:
-            clause += f" NULLS {nulls}"
-        return clause
+    def _window_total(self) -> bool:
+        # Only sorts that read every match anyway get the total for free
+        return self._order_sql({}) not in _INDEX_ORDERS
 
-    def build(self) -> tuple[str, dict]:
+    def build(self, with_total: bool = False) -> tuple[str, dict]:
         params = self._params()
         order = self._order_sql(params)
-        limit, offset = self._page_size, (self._page - 1) * self._page_size
-
-        search_sql = " AND ".join(s[0] for s in self._search) if self._search else None
-        filter_sql = " AND ".join(f[0] for f in self._filter) if self._filter else None
-
-        if search_sql and filter_sql:
-            sql = f"SELECT {_SELECT} FROM (SELECT {_SUBQUERY} FROM mv_books_dc WHERE {search_sql}) t WHERE {filter_sql} ORDER BY {order} LIMIT {limit} OFFSET {offset}"
-        elif search_sql:
-            sql = f"SELECT {_SELECT} FROM mv_books_dc WHERE {search_sql} ORDER BY {order} LIMIT {limit} OFFSET {offset}"
-        elif filter_sql:
-            sql = f"SELECT {_SELECT} FROM mv_books_dc WHERE {filter_sql} ORDER BY {order} LIMIT {limit} OFFSET {offset}"
-        else:
-            sql = f"SELECT {_SELECT} FROM mv_books_dc ORDER BY {order} LIMIT {limit} OFFSET {offset}"
-
-        return sql, params
+        # Bound rather than inlined, so every page of a query shares one SQL string
+        params["_limit"] = self._page_size
+        params["_offset"] = (self._page - 1) * self._page_size
+        select = _CROSSWALK_SELECT.get(self._crosswalk, _SELECT)
+        return _select_sql(*self._shape(), order, select, with_total), params
 
     def build_count(self) -> tuple[str, dict]:
-        params = self._params()
-        search_sql = " AND ".join(s[0] for s in self._search) if self._search else None
-        filter_sql = " AND ".join(f[0] for f in self._filter) if self._filter else None
-
-        if search_sql and filter_sql:
-            return (
-                f"SELECT COUNT(*) FROM (SELECT {_SUBQUERY} FROM mv_books_dc WHERE {search_sql}) t WHERE {filter_sql}",
-                params,
-            )
-        elif search_sql:
-            return f"SELECT COUNT(*) FROM mv_books_dc WHERE {search_sql}", params
-        elif filter_sql:
-            return f"SELECT COUNT(*) FROM mv_books_dc WHERE {filter_sql}", params
-        return "SELECT COUNT(*) FROM mv_books_dc", params
+        return _count_sql(*self._shape()), self._params()
 
 
 # =============================================================================
@@ -345,8 +464,30 @@ class FullTextSearch:
             pool_pre_ping=True,
             pool_recycle=300,
         )
+        if cfg.JIT is not None:
+            jit = f"-c jit={'on' if cfg.JIT else 'off'}"
+
+            @event.listens_for(self.engine, "do_connect")
+            def _set_options(dialect, conn_rec, cargs, cparams):
+                # An explicit options string replaces libpq's own PGOPTIONS lookup,
+                # so read the environment per connection and keep its settings too.
+                cparams["options"] = f"{os.environ.get('PGOPTIONS', '')} {jit}".strip()
+
         self.Session = sessionmaker(bind=self.engine)
         self._custom_transformer: Callable | None = None
+        # Results only change on MV refresh, so with CACHE_TTL set, repeated and
+        # paged queries reuse them.
+        self._count_cache = TTLCache(maxsize=1024, ttl=cfg.CACHE_TTL)
+        self._page_cache = TTLCache(maxsize=256, ttl=cfg.CACHE_TTL)
+        self._locc_cache = TTLCache(maxsize=512, ttl=cfg.CACHE_TTL)
+        self._listing_cache = TTLCache(maxsize=1024, ttl=cfg.CACHE_TTL)
+
+    def clear_cache(self) -> None:
+        """Drop cached totals, pages and lookups, e.g. after refresh_mv_books_dc()."""
+        self._count_cache.clear()
+        self._page_cache.clear()
+        self._locc_cache.clear()
+        self._listing_cache.clear()
 
     def set_custom_transformer(self, fn: Callable) -> None:
         """Set custom transformer for Crosswalk.CUSTOM."""
@@ -358,35 +499,114 @@ class FullTextSearch:
         q._crosswalk = crosswalk
         return q
 
-    def _transform(self, row, cw: Crosswalk) -> dict:
+    def _transformer(self, cw: Crosswalk) -> Callable:
         if cw == Crosswalk.CUSTOM and self._custom_transformer:
-            return self._custom_transformer(row)
-        return CROSSWALK_MAP[cw](row)
-
-    def execute(self, q: SearchQuery) -> dict:
-        """Execute query and return paginated results."""
-        with self.Session() as session:
-            count_sql, count_params = q.build_count()
-            total = session.execute(text(count_sql), count_params).scalar() or 0
-            total_pages = max(1, (total + q._page_size - 1) // q._page_size)
-            q._page = max(1, min(q._page, total_pages))
-
-            sql, params = q.build()
-            rows = session.execute(text(sql), params).fetchall()
-
+            return self._custom_transformer
+        return CROSSWALK_MAP[cw]
+
+    def _count(self, session, q: SearchQuery) -> int:
+        sql, params = q.build_count()
+        key = (sql, freeze_params(params))
+        total = self._count_cache.get(key)
+        if total is None:
+            total = session.execute(_stmt(sql), params).scalar() or 0
+            self._count_cache.set(key, total)
+        return total
+
+    def _fetch_page(self, session, q: SearchQuery, with_total: bool = False) -> list:
+        sql, params = q.build(with_total)
+        if q._order == OrderBy.RANDOM:
+            return session.execute(_stmt(sql), params).fetchall()
+        # Windowed rows carry _total and plain ones do not, so they never share a key
+        key = (sql, freeze_params(params))
+        rows = self._page_cache.get(key)
+        if rows is None:
+            rows = session.execute(_stmt(sql), params).fetchall()
+            self._page_cache.set(key, rows)
+        return rows
+
+    def _execute(self, session, q: SearchQuery) -> dict:
+        rows = None
+        count_sql, count_params = q.build_count()
+        count_key = (count_sql, freeze_params(count_params))
+        total = self._count_cache.get(count_key)
+        if total is None and q._window_total():
+            # Total and page in one round trip; an empty page means no matches
+            # or a page past the end, which needs the real count to clamp.
+            rows = self._fetch_page(session, q, with_total=True)
+            if rows:
+                total = rows[0]._total
+                self._count_cache.set(count_key, total)
+        if total is None:
+            total = self._count(session, q)
+        total_pages = max(1, (total + q._page_size - 1) // q._page_size)
+        page = max(1, min(q._page, total_pages))
+        if rows is None or page != q._page:
+            q._page = page
+            rows = self._fetch_page(session, q)
+
+        transform = self._transformer(q._crosswalk)
         return {
-            "results": [self._transform(r, q._crosswalk) for r in rows],
+            "results": [transform(r) for r in rows],
             "page": q._page,
             "page_size": q._page_size,
             "total": total,
             "total_pages": total_pages,
         }
 
+    def execute(self, q: SearchQuery) -> dict:
+        """Execute query and return paginated results."""
+        with self.Session() as session:
+            return self._execute(session, q)
+
+    def execute_with_facets(
+        self, q: SearchQuery, facet_limit: int = 15, max_books: int = 1000
+    ) -> dict:
+        """
+        Execute query and attach its top subjects under the 'facets' key.
+
+        Both run on one connection, so a search page with facets costs two
+        round trips instead of a separate count, page and facet query. Facets
+        sample the max_books most downloaded matches regardless of q's sort,
+        so they stay put when the page is re-sorted.
+
+        Facets are best-effort: if their query fails, 'facets' is None and
+        the page is still returned.
+        """
+        with self.Session() as session:
+            result = self._execute(session, q)
+            try:
+                result["facets"] = self._top_subjects(
+                    session, q, facet_limit, max_books, _FACET_ORDER
+                )
+            except SQLAlchemyError as e:
+                log.warning("Top subjects error: %s", e)
+                result["facets"] = None
+        return result
+
     def count(self, q: SearchQuery) -> int:
         """Count results without fetching."""
         with self.Session() as session:
-            sql, params = q.build_count()
-            return session.execute(text(sql), params).scalar() or 0
+            return self._count(session, q)
+
+    @staticmethod
+    def _raw_rows(session, sql: str, params: dict | None = None) -> list[tuple]:
+        # Plain tuples from the DBAPI cursor; skips Row construction on large listings
+        with session.connection().connection.cursor() as cur:
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+    def _listing(self, key: str, sql: str) -> list[dict]:
+        rows = self._listing_cache.get(key)
+        if rows is None:
+            with self.Session() as session:
+                rows = [
+                    {"id": i, "name": n, "book_count": c}
+                    for i, n, c in self._raw_rows(session, sql)
+                ]
+            self._listing_cache.set(key, rows)
+        # Callers re-sort and annotate the result; keep the cached copy intact
+        return [dict(r) for r in rows]
 
     def list_bookshelves(self) -> list[dict]:
         """
@@ -402,11 +622,7 @@ class FullTextSearch:
             GROUP BY bs.pk, bs.bookshelf
             ORDER BY bs.bookshelf
         """
-        with self.Session() as session:
-            rows = session.execute(text(sql)).fetchall()
-            return [
-                {"id": r.id, "name": r.name, "book_count": r.book_count} for r in rows
-            ]
+        return self._listing("bookshelves", sql)
 
     def list_subjects(self) -> list[dict]:
         """
@@ -422,11 +638,7 @@ class FullTextSearch:
             GROUP BY s.pk, s.subject
             ORDER BY book_count DESC, s.subject
         """
-        with self.Session() as session:
-            rows = session.execute(text(sql)).fetchall()
-            return [
-                {"id": r.id, "name": r.name, "book_count": r.book_count} for r in rows
-            ]
+        return self._listing("subjects", sql)
 
     def get_subject_name(self, subject_id: int) -> str | None:
         """
@@ -438,10 +650,14 @@ class FullTextSearch:
         Returns:
             Subject name or None if not found
         """
-        sql = "SELECT subject FROM subjects WHERE pk = :id"
-        with self.Session() as session:
-            result = session.execute(text(sql), {"id": subject_id}).scalar()
-            return result
+        key = ("subject_name", subject_id)
+        name = self._listing_cache.get(key, _MISSING)
+        if name is _MISSING:
+            sql = "SELECT subject FROM subjects WHERE pk = :id"
+            with self.Session() as session:
+                name = session.execute(_stmt(sql), {"id": subject_id}).scalar()
+            self._listing_cache.set(key, name)
+        return name
 
     def get_top_subjects_for_query(
         self, q: SearchQuery, limit: int = 15, max_books: int = 1000
@@ -457,42 +673,70 @@ class FullTextSearch:
         Returns:
             List of dicts with 'id', 'name', and 'count' keys, sorted by count desc
         """
+        with self.Session() as session:
+            return self._top_subjects(session, q, limit, max_books)
+
+    def _top_subjects(
+        self,
+        session,
+        q: SearchQuery,
+        limit: int,
+        max_books: int,
+        order: str | None = None,
+    ) -> list[dict]:
         max_books = max(1, min(5000, int(max_books)))
         limit = max(1, min(100, int(limit)))
 
         params = q._params()
-        order_sql = q._order_sql(params)
-        search_sql = " AND ".join(s[0] for s in q._search) if q._search else None
-        filter_sql = " AND ".join(f[0] for f in q._filter) if q._filter else None
-        where_parts = [p for p in (search_sql, filter_sql) if p]
-        where_clause = f"WHERE {' AND '.join(where_parts)}" if where_parts else ""
-
-        sql = f"""
-            WITH matched_books AS (
-                SELECT book_id
-                FROM mv_books_dc
-                {where_clause}
-                ORDER BY {order_sql}
-                LIMIT :max_books
-            )
-            SELECT
-                s.pk AS id,
-                s.subject AS name,
-                COUNT(*) AS count
-            FROM matched_books mb
-            JOIN mn_books_subjects mbs ON mbs.fk_books = mb.book_id
-            JOIN subjects s ON s.pk = mbs.fk_subjects
-            GROUP BY s.pk, s.subject
-            ORDER BY count DESC
-            LIMIT :limit
-        """
+        sql = _top_subjects_sql(*q._shape(), order or q._order_sql(params))
         params["limit"] = limit
         params["max_books"] = max_books
 
+        rows = session.execute(_stmt(sql), params).fetchall()
+        return [{"id": r.id, "name": r.name, "count": r.count} for r in rows]
+
+    def get_bookshelf_samples_batch(
+        self,
+        bookshelf_ids: list[int],
+        sample_limit: int = 15,
+        crosswalk: Crosswalk = Crosswalk.OPDS,
+    ) -> dict[int, dict]:
+        """
+        Random sample books and total book count for several bookshelves at once.
+
+        Args:
+            bookshelf_ids: Bookshelf ids to sample
+            sample_limit: Maximum number of books per bookshelf (default 15)
+            crosswalk: Output format for the sampled books
+
+        Returns:
+            Dict mapping each bookshelf id to {'total': int, 'results': list}
+        """
+        ids = [int(i) for i in bookshelf_ids]
+        if not ids:
+            return {}
+        params = {"ids": ids, "sample_limit": max(1, int(sample_limit))}
         with self.Session() as session:
-            rows = session.execute(text(sql), params).fetchall()
-            return [{"id": r.id, "name": r.name, "count": r.count} for r in rows]
+            rows = self._raw_rows(session, _SHELF_SAMPLES_SQL, params)
+
+        # Empty shelves produce no rows and keep the zero total
+        transform = self._transformer(crosswalk)
+        samples = {i: {"total": 0, "results": []} for i in ids}
+        for r in map(_SampleRow._make, rows):
+            sample = samples[r.bs_id]
+            sample["total"] = r.total
+            sample["results"].append(transform(r))
+        return samples
 
     def get_locc_children(self, parent: LoCCMainClass | str) -> list[dict]:
-        with self.Session() as session:
-            return get_locc_children(parent, session)
+        if isinstance(parent, LoCCMainClass):
+            parent = parent.code
+        else:
+            parent = (parent or "").strip().upper()
+        children = self._locc_cache.get(parent)
+        if children is None:
+            with self.Session() as session:
+                children = get_locc_children(parent, session)
+            self._locc_cache.set(parent, children)
+        # Callers sort and annotate the result; keep the cached copy intact
+        return [dict(c) for c in children]
@@ -1,6 +1,9 @@
 import re
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
-from typing import Any, Callable
+from typing import Any, Callable, Hashable
 
 from sqlalchemy import text
 from sqlalchemy.orm import Session
@@ -9,9 +12,11 @@ from .constants import LoCCMainClass
 
 _RE_MARC_SUBFIELD = re.compile(r"\$[a-z]")
 _RE_MARC_SPSEP = re.compile(r"[\n ](,|:)([A-Za-z0-9])")
-_RE_CURLY_SINGLE = re.compile("[\u2018\u2019]")  # ' '
-_RE_CURLY_DOUBLE = re.compile("[\u201c\u201d]")  # " "
 _RE_TITLE_SPLITTER = re.compile(r"\s*[;:]\s*")
+# Curly single/double quotes to straight ones
+_CURLY_QUOTES = str.maketrans(
+    {"\u2018": "'", "\u2019": "'", "\u201c": '"', "\u201d": '"'}
+)
 
 
 _FIELDS_TO_FORMAT = frozenset(
@@ -36,8 +41,11 @@ def strip_marc_subfields(text: str) -> str:
     """
     if not text or not isinstance(text, str):
         return ""
-    text = _RE_MARC_SUBFIELD.sub("", text)
-    text = _RE_MARC_SPSEP.sub(r"\1 \2", text)
+    # Each pattern needs its trigger character; most values have neither
+    if "$" in text:
+        text = _RE_MARC_SUBFIELD.sub("", text)
+    if "," in text or ":" in text:
+        text = _RE_MARC_SPSEP.sub(r"\1 \2", text)
     return text.strip()
 
 
@@ -47,9 +55,9 @@ def normalize_text(text: str) -> str:
     """
     if not text or not isinstance(text, str):
         return ""
-    text = _RE_CURLY_SINGLE.sub("'", text)
-    text = _RE_CURLY_DOUBLE.sub('"', text)
-    text = _RE_TITLE_SPLITTER.sub(": ", text)
+    text = text.translate(_CURLY_QUOTES)
+    if ";" in text or ":" in text:
+        text = _RE_TITLE_SPLITTER.sub(": ", text)
     return text.rstrip(": ").strip()
 
 
@@ -69,7 +77,11 @@ def format_dict(d: dict, fields_to_format: frozenset = _FIELDS_TO_FORMAT) -> dic
     result = {}
     for key, value in d.items():
         if isinstance(value, str):
-            result[key] = format_field(key, value, fields_to_format)
+            # Most keys (href, type, rel, ...) only need the strip format_field does
+            if key in fields_to_format:
+                result[key] = format_field(key, value, fields_to_format)
+            else:
+                result[key] = value.strip()
         elif isinstance(value, dict):
             result[key] = format_dict(value, fields_to_format)
         elif isinstance(value, list):
@@ -83,11 +95,15 @@ def format_list(
     parent_key: str, lst: list, fields_to_format: frozenset = _FIELDS_TO_FORMAT
 ) -> list:
     result = []
+    format_strings = parent_key in fields_to_format
     for item in lst:
         if isinstance(item, dict):
             result.append(format_dict(item, fields_to_format))
         elif isinstance(item, str):
-            result.append(format_field(parent_key, item, fields_to_format))
+            if format_strings:
+                result.append(format_field(parent_key, item, fields_to_format))
+            else:
+                result.append(item.strip())
         elif isinstance(item, list):
             result.append(format_list(parent_key, item, fields_to_format))
         else:
@@ -127,9 +143,80 @@ def format_dict_result(
     return decorator(fn)
 
 
+class TTLCache:
+    """
+    Small thread-safe LRU cache whose entries expire after `ttl` seconds.
+
+    A `ttl` of 0 or less disables it: nothing is stored and every get() misses.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+def freeze_params(params: dict) -> tuple:
+    """
+    Hashable form of a bind-parameter dict, for use in cache keys.
+    """
+    return tuple(
+        sorted(
+            (k, tuple(v) if isinstance(v, list) else v) for k, v in params.items()
+        )
+    )
+
+
+_LOCC_ROOTS = tuple(
+    {"code": item.code, "label": item.label, "has_children": True}
+    for item in sorted(LoCCMainClass, key=lambda x: x.code)
+)
+
+_LOCC_CHILDREN_SQL = text(
+    """
+    SELECT lc.pk AS code, lc.locc AS label
+    FROM loccs lc
+    WHERE lc.pk LIKE :pattern AND lc.pk != :parent
+    ORDER BY char_length(lc.pk), lc.pk
+    """
+)
+
+
+def _locc_sort_key(item: dict) -> tuple[int, str]:
+    return len(item["code"]), item["code"]
+
+
 def get_locc_children(parent: LoCCMainClass | str, session: Session) -> list[dict]:
     """
     Get LoCC children for `parent` using the provided SQLAlchemy ORM Session.
+
+    Children are ordered by code length, then code.
     """
     if isinstance(parent, LoCCMainClass):
         parent = parent.code
@@ -137,32 +224,25 @@ def get_locc_children(parent: LoCCMainClass | str, session: Session) -> list[dic
         parent = (parent or "").strip().upper()
 
     if not parent:
-        sorted_classes = sorted(LoCCMainClass, key=lambda x: x.code)
-        return [
-            {"code": item.code, "label": item.label, "has_children": True}
-            for item in sorted_classes
-        ]
-
-    sql = text(
-        """
-        SELECT lc.pk AS code, lc.locc AS label,
-                EXISTS (
-                    SELECT 1 FROM loccs lc2 WHERE lc2.pk LIKE lc.pk || '%' AND lc2.pk != lc.pk
-                ) AS has_children
-        FROM loccs lc
-        WHERE lc.pk LIKE :pattern AND lc.pk != :parent
-        ORDER BY char_length(lc.pk), lc.pk
-        """
-    )
+        return [dict(item) for item in _LOCC_ROOTS]
 
     params = {"pattern": f"{parent}%", "parent": parent}
-    rows = session.execute(sql, params).mappings().all()
+    rows = session.execute(_LOCC_CHILDREN_SQL, params).mappings().all()
+
+    # Rows hold every descendant of parent, so a code has children iff another
+    # row extends it; in sorted order that row, if any, directly follows it.
+    codes = sorted(r["code"] for r in rows)
+    has_children = {
+        code for code, nxt in zip(codes, codes[1:]) if nxt.startswith(code)
+    }
 
-    return [
+    children = [
         {
             "code": r["code"],
             "label": r["label"],
-            "has_children": bool(r["has_children"]),
+            "has_children": r["code"] in has_children,
         }
         for r in rows
     ]
+    children.sort(key=_locc_sort_key)
+    return children
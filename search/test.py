@@ -10,7 +10,7 @@ from .constants import (
     SearchField,
     SearchType,
 )
-from .full_text_search import FullTextSearch
+from .full_text_search import Config, FullTextSearch
 
 s = FullTextSearch()
 
@@ -195,6 +195,10 @@ test(
 test(
     "where() - has description", s.query().where("dc->'description' IS NOT NULL")[1, 10]
 )
+test(
+    "FTS + where() with OR",
+    s.query().search("Shakespeare").where("downloads > :a OR is_audio", a=10000)[1, 10],
+)
 
 # === Ordering ===
 print("-" * 130)
@@ -288,6 +292,93 @@ count = s.count(s.query().search("Shakespeare"))
 ms = (time.perf_counter() - start) * 1000
 print(f"{'count()':<50} | {count:>6} | {ms:>7.1f}ms | (count only)")
 
+# === Facets ===
+print("-" * 130)
+print("Facets")
+print("-" * 130)
+start = time.perf_counter()
+data = s.execute_with_facets(
+    s.query().search("Shakespeare").order_by(OrderBy.TITLE)[1, 10], facet_limit=5
+)
+ms = (time.perf_counter() - start) * 1000
+top = data["facets"][0]["name"][:40] if data["facets"] else "N/A"
+print(
+    f"{'execute_with_facets()':<50} | {data['total']:>6} | {ms:>7.1f}ms | {len(data['facets'] or ())} subjects, top: {top}"
+)
+
+# === Bookshelf Samples ===
+print("-" * 130)
+print("Bookshelf Samples")
+print("-" * 130)
+start = time.perf_counter()
+samples = s.get_bookshelf_samples_batch([68, 644, 0], sample_limit=5)
+ms = (time.perf_counter() - start) * 1000
+shelves = ", ".join(
+    f"{bid}: {len(v['results'])}/{v['total']}" for bid, v in samples.items()
+)
+print(
+    f"{'get_bookshelf_samples_batch()':<50} | {len(samples):>6} | {ms:>7.1f}ms | {shelves}"
+)
+
+# Totals must match bookshelf_id() even where a book is linked to a shelf twice
+samples = s.get_bookshelf_samples_batch([8, 68, 644, 0], 500, Crosswalk.MINI)
+mismatched = [
+    bid
+    for bid, v in samples.items()
+    if v["total"] != s.count(s.query().bookshelf_id(bid))
+    or len({r["id"] for r in v["results"]}) != len(v["results"])
+]
+print(
+    f"{'samples vs bookshelf_id() count':<50} | {len(mismatched):>6} | {'':>9} | "
+    f"{'mismatched ' + str(mismatched) if mismatched else 'ok'}"
+)
+
+# === Caching ===
+print("-" * 130)
+print("Caching (CACHE_TTL=300)")
+print("-" * 130)
+
+
+class CachedConfig(Config):
+    CACHE_TTL = 300
+
+
+cached = FullTextSearch(CachedConfig())
+for name in ("cold", "warm"):
+    start = time.perf_counter()
+    data = cached.execute(cached.query().search("Novel")[2, 5])
+    ms = (time.perf_counter() - start) * 1000
+    print(f"{'execute() ' + name:<50} | {data['total']:>6} | {ms:>7.1f}ms |")
+
+cached.clear_cache()
+start = time.perf_counter()
+data = cached.execute(cached.query().search("Novel")[2, 5])
+ms = (time.perf_counter() - start) * 1000
+print(f"{'execute() after clear_cache()':<50} | {data['total']:>6} | {ms:>7.1f}ms |")
+
+
+class ShortTTLConfig(Config):
+    CACHE_TTL = 1
+
+
+# A total expires before pages cached after it. Title order takes the windowed
+# path, which must not pick up the plain page 3 cached while the total was live.
+short = FullTextSearch(ShortTTLConfig())
+short.execute(short.query().search("Novel").order_by(OrderBy.TITLE)[2, 5])
+time.sleep(0.6)
+short.execute(short.query().search("Novel").order_by(OrderBy.TITLE)[3, 5])
+time.sleep(0.6)
+start = time.perf_counter()
+try:
+    data = short.execute(short.query().search("Novel").order_by(OrderBy.TITLE)[3, 5])
+    ms = (time.perf_counter() - start) * 1000
+    print(
+        f"{'execute() after total expired':<50} | {data['total']:>6} | {ms:>7.1f}ms |"
+    )
+except Exception as e:
+    ms = (time.perf_counter() - start) * 1000
+    print(f"{'execute() after total expired':<50} | {'ERR':>6} | {ms:>7.1f}ms | {e}")
+
 # === Custom Transformer ===
 print("-" * 130)
 print("Custom Transformer")
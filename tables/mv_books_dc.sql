@@ -493,6 +493,20 @@ CREATE INDEX idx_mv_jsonb_creators ON mv_books_dc USING GIN ((dc->'creators') js
 CREATE INDEX idx_mv_jsonb_subjects ON mv_books_dc USING GIN ((dc->'subjects') jsonb_path_ops);
 CREATE INDEX idx_mv_jsonb_bookshelves ON mv_books_dc USING GIN ((dc->'bookshelves') jsonb_path_ops);
 
+-- ============================================================================
+-- B-TREE: Junction lookups by bookshelf (base table, survives MV rebuilds)
+-- ============================================================================
+-- Per-shelf sampling and bookshelf_id() filters probe by fk_bookshelves first.
+CREATE INDEX IF NOT EXISTS idx_mbb_bookshelf_book ON mn_books_bookshelves (fk_bookshelves, fk_books);
+
+-- ============================================================================
+-- Extended statistics: facet filters that are commonly combined
+-- ============================================================================
+-- copyrighted / is_audio are low-cardinality and correlated; without this the
+-- planner multiplies their selectivities and underestimates combined filters.
+CREATE STATISTICS stat_mv_copyright_audio (ndistinct, dependencies)
+    ON copyrighted, is_audio FROM mv_books_dc;
+
 ANALYZE mv_books_dc;
 
 -- ============================================================================